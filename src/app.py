@@ -2,16 +2,20 @@ from fastapi import FastAPI, HTTPException
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from uvicorn import run
+import functools
+import os
 import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 
 import structlog
+from .tools import communes_store
 from .tools.get_city import get_city_by_name, get_cities_by_postal_code
 from .tools.map import generate_map, ListCircuitsParams, CircuitParams
 from .tools.color_code import generate_distinct_colors
 from . import __version__
 from .tools.health import (
-    check_database_connection,
+    check_database_connection_async,
     HealthResponse,
 )
 
@@ -27,7 +31,38 @@ class MapRequest(BaseModel):
     cluster_colors: list[str] | None = None
 
 
-app = FastAPI()
+@functools.lru_cache(maxsize=256)
+def _build_circuits(
+    nbr_circuits: int, colors: tuple[str, ...], clustering_method: str
+) -> ListCircuitsParams:
+    """
+    Build the circuits parameters for a map request.
+
+    Cached as most requests share the same number of clusters and default colors,
+    the returned parameters are frozen so they can be shared between requests.
+    """
+    return ListCircuitsParams(
+        nbr_circuits=nbr_circuits,
+        circuits=[
+            CircuitParams(nom=f"Cluster {i+1}", color=color)
+            for i, color in enumerate(colors)
+        ],
+        clustering_method=clustering_method,
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the communes file at startup rather than in the first request,
+    # on failure it is loaded on first use and /health reports the missing data
+    try:
+        communes_store.ensure_loaded()
+    except Exception as e:
+        logger.error("Failed to preload communes file", error=str(e))
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Track application start time for uptime calculation
 app_start_time = time.time()
@@ -48,7 +83,7 @@ async def health_check():
     """
     try:
         # Perform all health checks
-        database_check = check_database_connection()
+        database_check = await check_database_connection_async()
 
         # Determine overall status
         all_checks = [database_check]
@@ -144,13 +179,10 @@ async def get_city_map_html(request: MapRequest):
             cluster_colors = request.cluster_colors
 
         # Create CircuitParams dynamically from cluster_colors
-        list_circuits = ListCircuitsParams(
-            nbr_circuits=request.cluster_nbr,
-            circuits=[
-                CircuitParams(nom=f"Cluster {i+1}", color=color)
-                for i, color in enumerate(cluster_colors[: request.cluster_nbr])
-            ],
-            clustering_method=request.clustering_method,
+        list_circuits = _build_circuits(
+            request.cluster_nbr,
+            tuple(cluster_colors[: request.cluster_nbr]),
+            request.clustering_method,
         )
 
         # Generate the map
@@ -179,4 +211,13 @@ async def get_city_map_html(request: MapRequest):
 
 
 if __name__ == "__main__":
-    run(app, host="0.0.0.0", port=8000)
+    run(
+        "src.app:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        access_log=False,
+        log_level="warning",
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+    )
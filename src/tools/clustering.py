@@ -1,74 +1,139 @@
-from math import radians, cos, sin, sqrt, atan2
+import numpy as np
 import pandas as pd
-from sklearn.cluster import KMeans
+from sklearn.cluster import MiniBatchKMeans
 import structlog
 
+try:
+    from numba import vectorize
+except ImportError:  # Numba is optional, fall back to plain NumPy
+    vectorize = None
+
 logger = structlog.get_logger()
 
 
-def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+def haversine(
+    lat1: float | np.ndarray,
+    lon1: float | np.ndarray,
+    lat2: float | np.ndarray,
+    lon2: float | np.ndarray,
+) -> float | np.ndarray:
     """
     Calculate the great-circle distance between two points
-    on the Earth (specified in decimal degrees)
+    on the Earth (specified in decimal degrees).
+    Works element-wise when given NumPy arrays.
     """
     # Convert decimal degrees to radians
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    lat1 = np.radians(lat1)
+    lon1 = np.radians(lon1)
+    lat2 = np.radians(lat2)
+    lon2 = np.radians(lon2)
     # Haversine formula
     dlat = lat2 - lat1
     dlon = lon2 - lon1
-    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
     r = 6371000  # Radius of Earth in meters
     return r * c
 
 
-def detect_outliers(series: pd.Series) -> pd.Series:
+if vectorize is not None:
+    # Compile the same formula into a parallel NumPy ufunc
+    haversine = vectorize(
+        ["float64(float64, float64, float64, float64)"],
+        fastmath=True,
+        cache=True,
+        target="parallel",
+    )(haversine)
+
+
+def detect_outliers(df: pd.DataFrame) -> pd.Series:
     """
-    Detect outliers in a series using the IQR method.
+    Detect the outlier address numbers of every street using the IQR method.
+
+    A street only gets an outlier when exactly one of its numbers falls outside
+    the bounds.
+
+    Returns:
+        pd.Series: Boolean mask aligned with df, True for outlier rows.
     """
-    Q1 = series.quantile(0.25)
-    Q3 = series.quantile(0.75)
+    numeros = df.groupby("nom_voie")["numero"]
+    Q1 = df["nom_voie"].map(numeros.quantile(0.25))
+    Q3 = df["nom_voie"].map(numeros.quantile(0.75))
     IQR = Q3 - Q1
     lower_bound = Q1 - 5 * IQR
     upper_bound = Q3 + 5 * IQR
-    outliers = series[(series < lower_bound) | (series > upper_bound)]
-    return outliers if len(outliers) == 1 else pd.Series()
+    outside = (df["numero"] < lower_bound) | (df["numero"] > upper_bound)
+    outside_count = outside.groupby(df["nom_voie"]).transform("sum")
+    return outside & (outside_count == 1)
 
 
-def estimate_street_type(df: pd.DataFrame, street_name: str) -> str:
+def estimate_street_types(df: pd.DataFrame) -> pd.Series:
     """
-    Estimate the type of street based on the distribution of the number of addresses.
+    Estimate the type of every street based on the distribution of the number of addresses.
+
+    Returns:
+        pd.Series: Indexed by 'nom_voie', with "Center" or "Side" values.
     """
-    df_street = df[df["nom_voie"] == street_name]
-    numeros = df_street["numero"].sort_values()
-    outliers = detect_outliers(numeros)
-    if not outliers.empty:
-        # Filter outliers for analysis
-        numeros = numeros[~numeros.isin(outliers)]
+    outliers = detect_outliers(df)
+    # Filter outliers for analysis
+    numeros = df.loc[~outliers, ["nom_voie", "numero"]].sort_values(
+        ["nom_voie", "numero"]
+    )
     # Calculate the distances between consecutive numbers
-    numero_distance = numeros.diff().dropna()
+    numero_distance = numeros.groupby("nom_voie")["numero"].diff()
+    median_distance = numero_distance.groupby(numeros["nom_voie"]).median()
     # If the median of the distances is < 3, it's a center-city
-    if numero_distance.median() < 3:
-        if not outliers.empty:
-            logger.warning(
-                f"Attention : valeurs aberrantes détectées pour {street_name} : {outliers.tolist()}"
-            )
-        return "Center"
-    else:
-        return "Side"
+    street_type = pd.Series(
+        np.where(median_distance < 3, "Center", "Side"), index=median_distance.index
+    )
+    center_outliers = df.loc[
+        outliers & df["nom_voie"].map(street_type).eq("Center"), ["nom_voie", "numero"]
+    ]
+    for street_name, numero in center_outliers.itertuples(index=False):
+        logger.warning(
+            f"Attention : valeurs aberrantes détectées pour {street_name} : {[numero]}"
+        )
+    return street_type
 
 
-def estimate_street_length(df: pd.DataFrame, street_name: str) -> int:
-    df_street = df[df["nom_voie"] == street_name]
-    street_type = estimate_street_type(df, street_name)
-    if street_type == "Side":
-        return int(df_street["numero"].max())
-    else:
-        lat_min = df_street["lat"].min()
-        lat_max = df_street["lat"].max()
-        lon_min = df_street["lon"].min()
-        lon_max = df_street["lon"].max()
-        return int(haversine(lat_min, lon_min, lat_max, lon_max))
+def estimate_street_lengths(df: pd.DataFrame) -> pd.Series:
+    """
+    Estimate the length of every street in a single groupby pass.
+
+    Side streets and streets with less than 3 addresses use their highest
+    address number (metric numbering), center streets use the distance
+    between their bounding box corners.
+
+    Returns:
+        pd.Series: Indexed by 'nom_voie', with the estimated length in meters.
+    """
+    streets = df.groupby("nom_voie").agg(
+        lat_min=("lat", "min"),
+        lat_max=("lat", "max"),
+        lon_min=("lon", "min"),
+        lon_max=("lon", "max"),
+        num_max=("numero", "max"),
+        num_count=("numero", "size"),
+    )
+    # Streets with less than 3 addresses are too sparse to estimate a type,
+    # their highest number is used as length
+    short_street = streets["num_count"].to_numpy() < 3
+    long_streets = streets.index[~short_street]
+    street_type = estimate_street_types(df[df["nom_voie"].isin(long_streets)]).reindex(
+        streets.index
+    )
+    distance = haversine(
+        streets["lat_min"].to_numpy(),
+        streets["lon_min"].to_numpy(),
+        streets["lat_max"].to_numpy(),
+        streets["lon_max"].to_numpy(),
+    )
+    length = np.where(
+        short_street | (street_type.to_numpy() == "Side"),
+        streets["num_max"].to_numpy(),
+        distance,
+    )
+    return pd.Series(length, index=streets.index, name="length")
 
 
 def get_street_data(df: pd.DataFrame) -> pd.DataFrame:
@@ -79,20 +144,12 @@ def get_street_data(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: Indexed by 'nom_voie', with columns 'count', 'mean_lat', 'mean_lon', and 'length'.
 
     """
-    result = (
-        df.groupby("nom_voie")
-        .agg(
-            count=("address", "count"),
-            mean_lat=("lat", "mean"),
-            mean_lon=("lon", "mean"),
-        )
-        .reset_index()
-    )
-    result["length"] = result["nom_voie"].apply(
-        lambda street: estimate_street_length(df, street)
+    result = df.groupby("nom_voie").agg(
+        count=("address", "count"),
+        mean_lat=("lat", "mean"),
+        mean_lon=("lon", "mean"),
     )
-    result["length"] = result["length"].astype(int)
-    result.set_index("nom_voie", inplace=True)
+    result["length"] = estimate_street_lengths(df).astype(int)
     result.rename(columns={"mean_lat": "lat", "mean_lon": "lon"}, inplace=True)
     return result
 
@@ -100,22 +157,38 @@ def get_street_data(df: pd.DataFrame) -> pd.DataFrame:
 def weighted_spatial_clustering(
     df: pd.DataFrame, column_to_balance: str, n_clusters: int
 ):
-    logger.info("Starting Weighted Spatial Clustering")
-    logger.info(f"Clustering {column_to_balance} with {n_clusters} clusters")
+    logger.info(
+        "Starting Weighted Spatial Clustering",
+        column_to_balance=column_to_balance,
+        n_clusters=n_clusters,
+    )
     result_df = df.copy()
-    X = df[["lat", "lon"]].values
+    # float32 halves the memory scanned by each KMeans iteration. Coordinates
+    # are centered first: unlike KMeans, MiniBatchKMeans does not center its
+    # input, and around 44° float32 loses the differences between streets
+    lat = df["lat"].to_numpy(dtype=np.float64)
+    lon = df["lon"].to_numpy(dtype=np.float64)
+    X = np.empty((len(df), 2), dtype=np.float32)
+    X[:, 0] = lat - lat.mean()
+    # Scale longitudes so that euclidean distances approximate ground distances
+    X[:, 1] = (lon - lon.mean()) * np.cos(np.radians(lat.mean()))
     if column_to_balance is None:
         weights = None
     else:
-        weights = df[column_to_balance].values
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42).fit(
-        X, sample_weight=weights
-    )
+        weights = df[column_to_balance].to_numpy(dtype=np.float32)
+    kmeans = MiniBatchKMeans(
+        n_clusters=n_clusters,
+        random_state=42,
+        n_init=3,
+        batch_size=min(1024, len(X)),
+    ).fit(X, sample_weight=weights)
     result_df["cluster"] = kmeans.labels_
     stats_cluster = result_df.groupby("cluster").agg({"count": "sum", "length": "sum"})
-    logger.info(f"Clustering Complete for {column_to_balance}")
-    logger.info(stats_cluster)
-    logger.info("Clustering Complete")
+    logger.info(
+        "Clustering Complete",
+        column_to_balance=column_to_balance,
+        stats_cluster=stats_cluster,
+    )
     return result_df, stats_cluster
 
 
@@ -123,21 +196,23 @@ def add_cluster_to_df(df: pd.DataFrame, df_cluster: pd.DataFrame) -> pd.DataFram
     """
     Add the cluster column to the df dataframe.
     """
-    df_with_cluster = df.merge(
-        df_cluster[["cluster"]], left_on="nom_voie", right_index=True, how="left"
-    )
-    return df_with_cluster
+    df["cluster"] = df["nom_voie"].map(df_cluster["cluster"])
+    return df
 
 
 def make_balanced_clustering(
     df: pd.DataFrame,
     column_to_balance: str,
     n_clusters: int,
+    df_streets: pd.DataFrame | None = None,
 ) -> pd.DataFrame:
     """
     Make a balanced clustering of the df dataframe.
+
+    df_streets can be given when the street data of df was already computed.
     """
-    df_streets = get_street_data(df)
+    if df_streets is None:
+        df_streets = get_street_data(df)
 
     df_clustered, stats_cluster = weighted_spatial_clustering(
         df_streets, column_to_balance, n_clusters
@@ -1,6 +1,9 @@
-import colorsys
+import functools
 
+import numpy as np
 
+
+@functools.lru_cache(maxsize=256)
 def generate_distinct_colors(n, saturation=0.7, value=0.95):
     """
     Generate n distinct hexadecimal colors for plotting markers on a map.
@@ -11,16 +14,23 @@ def generate_distinct_colors(n, saturation=0.7, value=0.95):
         value (float, optional): Value/brightness level (0.0 to 1.0). Defaults to 0.95.
 
     Returns:
-        list: List of n hexadecimal color codes (e.g., ['#FF0000', '#00FF00', ...]).
+        tuple: Tuple of n hexadecimal color codes (e.g., ('#FF0000', '#00FF00', ...)).
+            Results are cached, hence the immutable return type.
     """
-    colors = []
-    for i in range(n):
-        # Distribute hues evenly around the color wheel
-        hue = i / n
-        rgb = colorsys.hsv_to_rgb(hue, saturation, value)
-        # Convert RGB to hexadecimal
-        hex_color = "#{:02X}{:02X}{:02X}".format(
-            int(rgb[0] * 255), int(rgb[1] * 255), int(rgb[2] * 255)
-        )
-        colors.append(hex_color)
-    return colors
+    # Distribute hues evenly around the color wheel
+    hues = np.arange(n) / n
+    # Vectorized HSV to RGB conversion, same formula as colorsys.hsv_to_rgb
+    sextant = (hues * 6.0).astype(int)
+    f = hues * 6.0 - sextant
+    p = np.full(n, value * (1.0 - saturation))
+    q = value * (1.0 - saturation * f)
+    t = value * (1.0 - saturation * (1.0 - f))
+    v = np.full(n, value)
+    sextant %= 6
+    conditions = [sextant == i for i in range(6)]
+    r = np.select(conditions, [v, q, p, p, t, v])
+    g = np.select(conditions, [t, v, v, q, p, p])
+    b = np.select(conditions, [p, p, t, v, v, q])
+    # Convert RGB to hexadecimal
+    rgb = (np.stack([r, g, b], axis=1) * 255).astype(int)
+    return tuple("#{:02X}{:02X}{:02X}".format(*color) for color in rgb.tolist())
@@ -0,0 +1,105 @@
+import functools
+import unicodedata
+
+import pandas as pd
+from rapidfuzz import fuzz, process, utils
+import structlog
+from ..settings import COMMUNES_FRANCE_FILENAME
+
+logger = structlog.get_logger()
+
+
+def _fold_name(name: str) -> str:
+    """
+    Normalize a name for fuzzy matching: accents folded to ASCII, lowercased
+    and without punctuation.
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return utils.default_process(stripped)
+
+
+@functools.lru_cache(maxsize=1)
+def _communes() -> tuple[
+    pd.DataFrame,
+    tuple[str, ...],
+    tuple[str, ...],
+    dict[str, list[dict[str, str]]],
+    dict[str, list[dict[str, str]]],
+]:
+    """
+    Load the communes file once and index it for the city lookups.
+
+    Returns:
+        A tuple (df, unique_names, folded_names, by_postal, by_name) where
+        folded_names are the unique names normalized for fuzzy matching, and
+        by_postal and by_name map a postal code or a city name to its unique
+        nom_standard/dep_code records.
+    """
+    logger.info("Loading communes file", filename=COMMUNES_FRANCE_FILENAME)
+    df = pd.read_parquet(COMMUNES_FRANCE_FILENAME)
+    df["code_postal"] = df["code_postal"].astype(str)
+    unique_names = tuple(df["nom_standard"].unique().tolist())
+    folded_names = tuple(_fold_name(name) for name in unique_names)
+
+    by_postal = {}
+    for code_postal, nom_standard, dep_code in (
+        df[["code_postal", "nom_standard", "dep_code"]]
+        .drop_duplicates()
+        .itertuples(index=False)
+    ):
+        by_postal.setdefault(code_postal, []).append(
+            {"nom_standard": nom_standard, "dep_code": dep_code}
+        )
+
+    by_name = {}
+    for nom_standard, dep_code in (
+        df[["nom_standard", "dep_code"]].drop_duplicates().itertuples(index=False)
+    ):
+        by_name.setdefault(nom_standard, []).append(
+            {"nom_standard": nom_standard, "dep_code": dep_code}
+        )
+
+    return df, unique_names, folded_names, by_postal, by_name
+
+
+def ensure_loaded() -> None:
+    """Load the communes file now instead of on the first lookup."""
+    _communes()
+
+
+def unique_names() -> tuple[str, ...]:
+    """Return the unique commune names, in file order."""
+    return _communes()[1]
+
+
+def get_by_postal(postal_code: str | int) -> list[dict[str, str]]:
+    """Return the nom_standard/dep_code records of a postal code."""
+    return [dict(record) for record in _communes()[3].get(str(postal_code), [])]
+
+
+def get_by_name(city_name: str) -> list[dict[str, str]]:
+    """Return the nom_standard/dep_code records of an exact commune name."""
+    return [dict(record) for record in _communes()[4].get(city_name, [])]
+
+
+def get_by_name_fuzzy(
+    city_name: str, score_cutoff: float = 80, limit: int = 5
+) -> list[tuple[str, float]]:
+    """
+    Fuzzy match a name against the commune names, ignoring accents and case.
+
+    Returns:
+        Up to limit (name, score) tuples with a score of at least score_cutoff,
+        best matches first.
+    """
+    _, names, folded_names, _, _ = _communes()
+    matches = process.extract(
+        _fold_name(city_name),
+        folded_names,
+        scorer=fuzz.WRatio,
+        processor=None,
+        score_cutoff=score_cutoff,
+        limit=limit,
+    )
+    return [(names[index], score) for _, score, index in matches]
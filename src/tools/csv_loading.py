@@ -1,12 +1,58 @@
+from contextlib import contextmanager
 import requests
 import pandas as pd
 import pathlib
 import structlog
+import tempfile
 
 from .validation import validate_departement, check_folder_path
 
 logger = structlog.get_logger()
 
+# Columns of the address files used downstream, and the dtypes to parse them with.
+# Free-text columns are Arrow-backed so filters and concatenations stay vectorized.
+ADDRESS_COLUMNS = [
+    "numero",
+    "rep",
+    "nom_voie",
+    "code_postal",
+    "nom_commune",
+    "lat",
+    "lon",
+]
+ADDRESS_DTYPES = {
+    "numero": "Int32",
+    "rep": "string[pyarrow]",
+    "nom_voie": "string[pyarrow]",
+    "code_postal": "Int32",
+    "nom_commune": "category",
+    "lat": "float32",
+    "lon": "float32",
+}
+
+
+@contextmanager
+def _atomic_write(filepath: pathlib.Path):
+    """
+    Open a temporary file next to filepath and move it in place once written.
+
+    The temporary file is unique to the writer, so concurrent writers never share
+    it, and an interrupted write never shadows the real file.
+    """
+    with tempfile.NamedTemporaryFile(
+        dir=filepath.parent, prefix=f"{filepath.name}.", suffix=".part", delete=False
+    ) as f:
+        partial_filepath = pathlib.Path(f.name)
+        try:
+            yield f
+        except BaseException:
+            f.close()
+            partial_filepath.unlink(missing_ok=True)
+            raise
+    # Temporary files are private to their owner, use the usual data file mode
+    partial_filepath.chmod(0o644)
+    partial_filepath.replace(filepath)
+
 
 def load_base_adresse_locale(
     departement: str | int, output_folder: pathlib.Path | None = None
@@ -26,35 +72,86 @@ def load_base_adresse_locale(
 
     # Download the file
     url = rf"https://adresse.data.gouv.fr/data/ban/adresses/latest/csv/adresses-{departement}.csv.gz"
-    response = requests.get(url)
-    response.raise_for_status()
-
-    # Save the file
-    with open(filepath, "wb") as f:
-        f.write(response.content)
+    # Stream the download instead of buffering the whole file in memory
+    with requests.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        with _atomic_write(filepath) as f:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
 
     logger.info("File saved", filepath=filepath)
     return filepath
 
 
+def convert_adresse_locale_to_parquet(
+    df: pd.DataFrame, parquet_filepath: pathlib.Path
+) -> pd.DataFrame:
+    """
+    Keep the used columns of an address DataFrame, downcast them and save them as parquet.
+
+    Args:
+        df: Address data as read from the CSV file
+        parquet_filepath: Path of the parquet file to write
+
+    Returns:
+        pd.DataFrame: The projected and downcast address data
+    """
+    df = df[ADDRESS_COLUMNS].copy()
+    # Missing numbers are kept as NaN, the clustering does not handle pd.NA
+    if df["numero"].notna().all():
+        df["numero"] = df["numero"].astype("int32")
+    else:
+        df["numero"] = df["numero"].astype("float64")
+    df[["lat", "lon"]] = df[["lat", "lon"]].astype("float32")
+    with _atomic_write(parquet_filepath) as f:
+        df.to_parquet(f, compression="zstd", index=False)
+    logger.info("File converted to parquet", filepath=parquet_filepath)
+    return df
+
+
 def get_df_adresse_locale(
     departement: str | int, folder_path: pathlib.Path | None = None
 ) -> pd.DataFrame:
     """
     Get address data for a specific department.
 
+    The downloaded CSV file is converted once to parquet, later calls read the parquet file.
+
     Args:
         departement: Department code (e.g., "34", "2A", "971")
         folder_path: Optional path to the folder where CSV files are stored
 
     Returns:
-        pd.DataFrame: Address data for the department
+        pd.DataFrame: Address data for the department, restricted to ADDRESS_COLUMNS
     """
     logger.info("Getting df adresse locale", departement=departement)
     departement = validate_departement(departement)
     filename = f"adresses-{departement}.csv.gz"
     folder_path = check_folder_path(folder_path)
     filepath = folder_path / filename
+    parquet_filepath = folder_path / f"adresses-{departement}.parquet"
+
+    if parquet_filepath.exists():
+        logger.info("File exists, loading from local", filepath=parquet_filepath.name)
+        try:
+            df = pd.read_parquet(
+                parquet_filepath, columns=ADDRESS_COLUMNS, engine="pyarrow"
+            )
+            logger.info(
+                "Successfully loaded address data",
+                rows=len(df),
+                departement=departement,
+            )
+            return df
+        except Exception as e:
+            # Drop the unreadable file so that it is rebuilt from the CSV file,
+            # downloading it again if needed
+            logger.error(
+                "Failed to read address data file, removing it",
+                error=str(e),
+                filepath=parquet_filepath,
+            )
+            parquet_filepath.unlink(missing_ok=True)
 
     if not filepath.exists():
         logger.info("File does not exist, loading from internet", filepath=filepath)
@@ -71,13 +168,29 @@ def get_df_adresse_locale(
         logger.info("File exists, loading from local", filepath=filepath.name)
 
     try:
-        df = pd.read_csv(filepath, compression="gzip", delimiter=";")
+        df = pd.read_csv(
+            filepath,
+            compression="gzip",
+            delimiter=";",
+            usecols=ADDRESS_COLUMNS,
+            dtype=ADDRESS_DTYPES,
+        )
         logger.info(
             "Successfully loaded address data", rows=len(df), departement=departement
         )
-        return df
     except Exception as e:
         logger.error(
             "Failed to read address data file", error=str(e), filepath=filepath
         )
         return pd.DataFrame()  # Return empty DataFrame on error
+
+    try:
+        df = convert_adresse_locale_to_parquet(df, parquet_filepath)
+        filepath.unlink(missing_ok=True)
+    except Exception as e:
+        logger.error(
+            "Failed to convert address data file to parquet",
+            error=str(e),
+            filepath=filepath,
+        )
+    return df
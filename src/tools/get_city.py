@@ -1,9 +1,7 @@
 import pathlib
 
-import pandas as pd
-from thefuzz import process
 import structlog
-from ..settings import COMMUNES_FRANCE_FILENAME
+from . import communes_store
 
 logger = structlog.get_logger()
 
@@ -24,13 +22,7 @@ def get_cities_by_postal_code(
     """
     logger.info("Getting city by postal code", postal_code=postal_code)
 
-    df = pd.read_parquet(COMMUNES_FRANCE_FILENAME)
-    df = df[df["code_postal"] == str(postal_code)]
-    city_department_records = []
-    for city in df["nom_standard"].unique().tolist():
-        res = df[df["nom_standard"] == city][["nom_standard", "dep_code"]]
-        city_department_records.extend(res.to_dict(orient="records"))
-    return city_department_records
+    return communes_store.get_by_postal(postal_code)
 
 
 def filter_cities(cities: list[tuple[str, int]]) -> list[str]:
@@ -52,14 +44,10 @@ def get_city_by_name(
     Retrieve the city name associated with a given postal code.
     """
     logger.info("Getting city by name", city_name=city_name)
-    df = pd.read_parquet(COMMUNES_FRANCE_FILENAME)
-    list_city_name = df["nom_standard"].unique().tolist()
-    city_names = process.extractBests(city_name, list_city_name, score_cutoff=80)
-    city_names = filter_cities(city_names)
+    city_names = filter_cities(communes_store.get_by_name_fuzzy(city_name))
     city_department_records = []
     for city in city_names:
-        res = df[df["nom_standard"] == city][["nom_standard", "dep_code"]]
-        city_department_records.extend(res.to_dict(orient="records"))
+        city_department_records.extend(communes_store.get_by_name(city))
     return city_department_records
 
 
@@ -1,9 +1,17 @@
 from pydantic import BaseModel
 from typing import Dict, Any
+import asyncio
 import os
+import time
 
 from ..settings import COMMUNES_FRANCE_FILENAME
 
+# Seconds during which a database check result is reused
+DATABASE_CHECK_TTL = 5.0
+
+# (monotonic timestamp, result) of the last database check
+_database_check_cache: tuple[float, Dict[str, Any]] | None = None
+
 
 class HealthResponse(BaseModel):
     status: str
@@ -13,7 +21,7 @@ class HealthResponse(BaseModel):
     checks: Dict[str, Any]
 
 
-def check_database_connection() -> Dict[str, Any]:
+def _check_database_files() -> Dict[str, Any]:
     """Check if database/data files are accessible."""
     try:
         # Check if data files exist
@@ -35,3 +43,45 @@ def check_database_connection() -> Dict[str, Any]:
         return {"status": "healthy", "message": "Data files accessible"}
     except Exception as e:
         return {"status": "unhealthy", "message": f"Database check failed: {str(e)}"}
+
+
+def _get_cached_database_check() -> Dict[str, Any] | None:
+    """Return a copy of the last database check result if it is still fresh."""
+    if (
+        _database_check_cache is None
+        or time.monotonic() - _database_check_cache[0] > DATABASE_CHECK_TTL
+    ):
+        return None
+    return dict(_database_check_cache[1])
+
+
+def _set_cached_database_check(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Store a database check result and return a copy of it."""
+    global _database_check_cache
+    _database_check_cache = (time.monotonic(), result)
+    return dict(result)
+
+
+def check_database_connection() -> Dict[str, Any]:
+    """
+    Check if database/data files are accessible.
+
+    The result is cached for DATABASE_CHECK_TTL seconds so frequent health
+    probes do not hit the filesystem on every call.
+    """
+    cached = _get_cached_database_check()
+    if cached is not None:
+        return cached
+    return _set_cached_database_check(_check_database_files())
+
+
+async def check_database_connection_async() -> Dict[str, Any]:
+    """
+    Check if database/data files are accessible without blocking the event loop.
+
+    Same as check_database_connection, the filesystem check runs in a worker thread.
+    """
+    cached = _get_cached_database_check()
+    if cached is not None:
+        return cached
+    return _set_cached_database_check(await asyncio.to_thread(_check_database_files))
@@ -1,151 +1,441 @@
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import json
+import multiprocessing
+import os
+
 import folium
+from folium.plugins import MarkerCluster
+import numpy as np
 import structlog
 import pandas as pd
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, field_validator
 import re
 from .csv_loading import get_df_adresse_locale
-from .clustering import make_balanced_clustering
+from .clustering import get_street_data, make_balanced_clustering
+
+try:
+    from numba import njit
+except ImportError:  # Numba is optional, fall back to pandas formatting
+    njit = None
 
 logger = structlog.get_logger()
 
+# Enough characters for any int64 with its sign
+_INT_STR_WIDTH = 20
+
+_HEX_COLOR = re.compile(r"^#[0-9a-fA-F]{6}$")
+
+# From this number of addresses the markers are written as a single JS array
+# instead of GeoJson layers, whose rendering cost grows with the data size
+DIRECT_MARKERS_MIN_ADDRESSES = 2000
+
+_ADDRESS_POPUP = folium.JsCode(
+    """
+    function (feature, layer) {
+        layer.bindPopup(function () {
+            return document.createTextNode(feature.properties.address);
+        });
+    }
+    """
+)
+
 
 class CircuitParams(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     nom: str
     color: str | None = None
 
-    # Check if the color is a valid hex color
-    if color and not re.match(r"^#([0-9a-fA-F]{6})$", color):
-        raise ValueError("Invalid hex color")
+    @field_validator("color")
+    @classmethod
+    def _check_color(cls, color: str | None) -> str | None:
+        # Check if the color is a valid hex color
+        if color is not None and not _HEX_COLOR.fullmatch(color):
+            raise ValueError("Invalid hex color")
+        return color
 
 
 class ListCircuitsParams(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     nbr_circuits: int = 1
-    circuits: list[CircuitParams] = []
+    circuits: tuple[CircuitParams, ...] = ()
     random_state: int = 42
     clustering_method: str = "kmeans"
 
 
-def build_address(row):
+class _RawScript(folium.Element):
     """
-    Constructs a standardized address string from a DataFrame row.
+    Script added to the page as is, without being compiled as a template.
+    """
+
+    def __init__(self, script: str):
+        super().__init__()
+        self._name = "RawScript"
+        self.script = script
+
+    def render(self, **kwargs) -> str:
+        return self.script
+
+
+class _CircleMarkers(folium.MacroElement):
+    """
+    Circle markers built on the client from a single JS array of
+    (lat, lon, address, circuit) points, added to the parent MarkerCluster.
+    """
+
+    def __init__(self, points: list[tuple], colors: list[str]):
+        super().__init__()
+        self._name = "CircleMarkers"
+        self.points = points
+        self.colors = colors
+
+    def render(self, **kwargs):
+        # Escape "<" so that no address can close the script tag
+        points = json.dumps(self.points, separators=(",", ":")).replace("<", "\\u003c")
+        colors = json.dumps(self.colors).replace("<", "\\u003c")
+        script = f"""
+        (function () {{
+            var points = {points};
+            var colors = {colors};
+            var markers = new Array(points.length);
+            function popup(layer) {{
+                return document.createTextNode(layer.options.address);
+            }}
+            for (var i = 0; i < points.length; i++) {{
+                var p = points[i];
+                markers[i] = L.circleMarker([p[0], p[1]], {{
+                    radius: 5,
+                    color: colors[p[3]],
+                    fill: true,
+                    fillColor: colors[p[3]],
+                    fillOpacity: 0.6,
+                    address: p[2],
+                }}).bindPopup(popup);
+            }}
+            {self._parent.get_name()}.addLayers(markers);
+        }})();
+        """
+        self.get_root().script.add_child(_RawScript(script), name=self.get_name())
+
+
+def _itoa_batch(values: np.ndarray, mask: np.ndarray, out: np.ndarray) -> None:
+    """
+    Write the decimal digits of each masked value at the start of its row of out.
+
+    Rows of out must be zeroed and _INT_STR_WIDTH wide, unmasked rows are left empty.
+    """
+    for i in range(values.shape[0]):
+        if not mask[i]:
+            continue
+        value = values[i]
+        start = 0
+        if value < 0:
+            out[i, 0] = 45  # "-"
+            start = 1
+            value = -value
+        n_digits = 1
+        rest = value // 10
+        while rest > 0:
+            n_digits += 1
+            rest //= 10
+        for j in range(start + n_digits - 1, start - 1, -1):
+            out[i, j] = 48 + value % 10  # "0" + digit
+            value //= 10
+
+
+if njit is not None:
+    _itoa_batch = njit(cache=True)(_itoa_batch)
+
+
+def _int_to_str(series: pd.Series) -> pd.Series:
+    """
+    Format a numeric column as integer strings, with empty strings for missing values.
+    """
+    if njit is None:
+        values = series.dropna()
+        return values.astype("int64").astype(str).reindex(series.index, fill_value="")
+
+    mask = series.notna().to_numpy()
+    values = series.to_numpy(dtype="float64", na_value=0).astype("int64")
+    out = np.zeros((len(series), _INT_STR_WIDTH), dtype=np.uint8)
+    _itoa_batch(values, mask, out)
+    # Trailing zero bytes are dropped by the fixed width bytes dtype
+    strings = out.view(f"S{_INT_STR_WIDTH}").ravel().astype(str)
+    return pd.Series(strings, index=series.index, dtype=str)
+
+
+def build_address_vectorized(df: pd.DataFrame) -> pd.Series:
+    """
+    Constructs standardized address strings for every row of a DataFrame.
 
     Args:
-        row (pd.Series): A row from the df_ville DataFrame.
+        df (pd.DataFrame): The df_ville DataFrame.
 
     Returns:
-        str: Formatted address string.
+        pd.Series: Formatted address strings, aligned with df.
     """
     # Extract components
-    numero = str(int(row["numero"])) if pd.notna(row["numero"]) else ""
-    rep = f" {row['rep']}" if pd.notna(row["rep"]) else ""
-    nom_voie = row["nom_voie"] if pd.notna(row["nom_voie"]) else ""
-    code_postal = str(int(row["code_postal"])) if pd.notna(row["code_postal"]) else ""
-    nom_commune = row["nom_commune"] if pd.notna(row["nom_commune"]) else ""
-
-    # Build address parts
-    address_parts = []
-    if numero:
-        address_parts.append(numero + rep)
-    if nom_voie:
-        address_parts.append(nom_voie)
+    numero = _int_to_str(df["numero"])
+    rep = (" " + df["rep"].astype(str)).where(df["rep"].notna(), "")
+    nom_voie = df["nom_voie"].astype(str).where(df["nom_voie"].notna(), "")
+    code_postal = _int_to_str(df["code_postal"])
+    nom_commune = df["nom_commune"].astype(str).where(df["nom_commune"].notna(), "")
+
+    # Build address parts, the rep is only kept along with a numero
+    numero_rep = (numero + rep).where(numero != "", "")
+    address_line = (
+        (numero_rep + ", " + nom_voie)
+        .mask(nom_voie == "", numero_rep)
+        .mask(numero_rep == "", nom_voie)
+    )
 
     # Combine into full address
-    address_line = ", ".join(address_parts)
-    full_address = f"{address_line}, {code_postal} {nom_commune}".strip(", ")
+    full_address = address_line + ", " + code_postal + " " + nom_commune
+    return full_address.str.strip(", ")
 
-    return full_address
 
+@functools.lru_cache(maxsize=16)
+def _load_dep(dep_code: int) -> pd.DataFrame:
+    """
+    Load the addresses of a department with their formatted address.
 
-def generate_map(
-    city_name: str,
-    dep_code: int,
-    list_circuits: ListCircuitsParams = ListCircuitsParams(),
-):
+    Cached per department, the returned DataFrame must not be modified.
+    Missing data raises instead of returning an empty DataFrame so that
+    failures are not cached.
     """
-    Generate a map for the specified city.
+    df = get_df_adresse_locale(dep_code)
+    if df.empty:
+        raise ValueError("No address data for the department")
+    df["address"] = build_address_vectorized(df)
+    return df
 
-    Args:
-        city_name: City name
-        dep_code: Department code
-        list_circuits: List of circuits
-    Returns:
-        folium.Map: The generated map
+
+@functools.lru_cache(maxsize=8)
+def _city_index(dep_code: int) -> dict[str, np.ndarray]:
     """
-    logger.info("Generating map", city_name=city_name, dep_code=dep_code)
-    dep_code = int(dep_code)
+    Map each city of a department to the positions of its addresses.
+    """
+    return _load_dep(dep_code).groupby("nom_commune", observed=True).indices
+
+
+@functools.lru_cache(maxsize=32)
+def _load_city(city_name: str, dep_code: int) -> pd.DataFrame:
+    """
+    Load the addresses of a city.
 
+    Cached per city, the returned DataFrame must not be modified.
+    """
     # Use department code if provided, otherwise try to extract from city data
     try:
         if not isinstance(dep_code, int):
             logger.error("Department code must be an integer", dep_code=dep_code)
             raise ValueError("Department code must be an integer")
-        df = get_df_adresse_locale(dep_code)
-        df = df[df["nom_commune"] == city_name]
-        if df.empty:
+        idx = _city_index(dep_code).get(city_name)
+        if idx is None:
             logger.error(
                 "City not found in the department",
                 city_name=city_name,
                 dep_code=dep_code,
             )
             raise ValueError("City not found in the department")
+        df = _load_dep(dep_code).iloc[idx].copy()
     except Exception as e:
         logger.error("Error generating map", error=str(e))
         raise ValueError("Error generating map")
 
     try:
         df = df[
-            ["numero", "rep", "nom_voie", "code_postal", "nom_commune", "lat", "lon"]
+            [
+                "numero",
+                "rep",
+                "nom_voie",
+                "code_postal",
+                "nom_commune",
+                "lat",
+                "lon",
+                "address",
+            ]
         ]
     except KeyError as e:
         logger.error("Error generating map", error=str(e))
         raise ValueError("Columns not found in the dataframe")
-    df["address"] = df.apply(build_address, axis=1)
-    center_lat = df["lat"].mean()
-    center_lon = df["lon"].mean()
-    logger.info("Center of the map", center_lat=center_lat, center_lon=center_lon)
+    return df
+
+
+@functools.lru_cache(maxsize=32)
+def _city_street_data(city_name: str, dep_code: int) -> pd.DataFrame:
+    """
+    Get the street data of a city, cached as it does not depend on the circuits.
+    """
+    return get_street_data(_load_city(city_name, dep_code))
+
+
+def generate_map(
+    city_name: str,
+    dep_code: int,
+    list_circuits: ListCircuitsParams = ListCircuitsParams(),
+):
+    """
+    Generate a map for the specified city.
+
+    Args:
+        city_name: City name
+        dep_code: Department code
+        list_circuits: List of circuits
+    Returns:
+        folium.Map: The generated map
+    """
+    logger.info("Generating map", city_name=city_name, dep_code=dep_code)
+    dep_code = int(dep_code)
+    df = _load_city(city_name, dep_code).copy()
+    if df.empty or df[["lat", "lon"]].isna().all(axis=None):
+        logger.error("No located address", city_name=city_name, dep_code=dep_code)
+        raise ValueError("No located address for the city")
+    if len(df) == 1:
+        center_lat, center_lon = df["lat"].iat[0], df["lon"].iat[0]
+    else:
+        center_lat = df["lat"].mean()
+        center_lon = df["lon"].mean()
+    logger.debug("Center of the map", center_lat=center_lat, center_lon=center_lon)
     m = folium.Map(location=[center_lat, center_lon], zoom_start=14)
 
-    # Generate the circuits
-    if list_circuits.nbr_circuits > 1:
+    # Generate the circuits, a city with fewer streets than circuits cannot
+    # be split so all its addresses go to the first circuit
+    if list_circuits.nbr_circuits > 1 and list_circuits.nbr_circuits <= len(
+        _city_street_data(city_name, dep_code)
+    ):
         clustering_method = list_circuits.clustering_method
 
         if clustering_method == "kmeans":
             df, stats_cluster = make_balanced_clustering(
-                df, None, list_circuits.nbr_circuits
+                df,
+                None,
+                list_circuits.nbr_circuits,
+                df_streets=_city_street_data(city_name, dep_code),
             )
         elif clustering_method == "balanced_length":
             df, stats_cluster = make_balanced_clustering(
-                df, "length", list_circuits.nbr_circuits
+                df,
+                "length",
+                list_circuits.nbr_circuits,
+                df_streets=_city_street_data(city_name, dep_code),
             )
         elif clustering_method == "balanced_count":
             df, stats_cluster = make_balanced_clustering(
-                df, "count", list_circuits.nbr_circuits
+                df,
+                "count",
+                list_circuits.nbr_circuits,
+                df_streets=_city_street_data(city_name, dep_code),
             )
         else:
             logger.error("Invalid method", method=clustering_method)
             raise ValueError("Invalid method")
     else:
         df["cluster"] = 0
-        stats_cluster = pd.DataFrame({"count": [len(df)], "length": None})
+        stats_cluster = pd.DataFrame(
+            {
+                "count": [len(df)] + [0] * (list_circuits.nbr_circuits - 1),
+                "length": None,
+            }
+        )
     for i in range(list_circuits.nbr_circuits):
         stats_cluster.loc[i, "color"] = list_circuits.circuits[i].color
 
-    for _, row in df.iterrows():
-        adresse = row["address"]
-        circuit = row["cluster"]
-        color = stats_cluster["color"][circuit]
-        folium.CircleMarker(
-            location=[row["lat"], row["lon"]],
-            radius=5,
-            color=color,
-            fill=True,
-            fill_color=color,
-            fill_opacity=0.6,
-            popup=adresse,
-        ).add_to(m)
+    # Add the markers by chunks so large cities do not freeze the browser,
+    # clustering only kicks in when zooming out of the initial view
+    marker_cluster = MarkerCluster(
+        options={
+            "chunkedLoading": True,
+            "chunkInterval": 200,
+            "chunkDelay": 50,
+            "disableClusteringAtZoom": 14,
+        }
+    ).add_to(m)
+
+    # Large cities skip the GeoJson layers, their markers are built on the
+    # client from a single array
+    if len(df) >= DIRECT_MARKERS_MIN_ADDRESSES:
+        points = list(
+            zip(
+                df["lat"].tolist(),
+                df["lon"].tolist(),
+                df["address"].tolist(),
+                df["cluster"].tolist(),
+            )
+        )
+        colors = [circuit.color for circuit in list_circuits.circuits]
+        _CircleMarkers(points, colors).add_to(marker_cluster)
+        return m, stats_cluster.to_dict()
+
+    # Emit the addresses of each circuit as a single GeoJSON layer rather
+    # than one marker object per address
+    for circuit, df_circuit in df.groupby("cluster"):
+        color = list_circuits.circuits[circuit].color
+        features = [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": {"address": adresse},
+            }
+            for lat, lon, adresse in zip(
+                df_circuit["lat"].tolist(),
+                df_circuit["lon"].tolist(),
+                df_circuit["address"].tolist(),
+            )
+        ]
+        folium.GeoJson(
+            {"type": "FeatureCollection", "features": features},
+            marker=folium.CircleMarker(
+                radius=5,
+                color=color,
+                fill=True,
+                fill_color=color,
+                fill_opacity=0.6,
+            ),
+            # Bind the popup to each marker: the MarkerCluster only adds the
+            # markers of a layer group to the map, not the group itself, so a
+            # popup bound to the GeoJson layer would never open
+            on_each_feature=_ADDRESS_POPUP,
+        ).add_to(marker_cluster)
     return m, stats_cluster.to_dict()
 
 
+def _generate_map_worker(
+    request: tuple[str, int, ListCircuitsParams],
+) -> tuple[str, dict]:
+    """
+    Generate a map in a worker process, returned as HTML as folium maps do
+    not cross process boundaries.
+    """
+    city_name, dep_code, list_circuits = request
+    m, stats_cluster = generate_map(city_name, dep_code, list_circuits)
+    return m._repr_html_(), stats_cluster
+
+
+def generate_maps(
+    requests: list[tuple[str, int, ListCircuitsParams]],
+) -> list[tuple[str, dict]]:
+    """
+    Generate several maps in parallel, one process per CPU.
+
+    Args:
+        requests: (city_name, dep_code, list_circuits) of each map
+    Returns:
+        list: The HTML of each map with its stats_cluster, in request order
+    """
+    if not requests:
+        return []
+    max_workers = min(os.cpu_count() or 1, len(requests))
+    # Spawn the workers, forking after pyarrow, numba or OpenMP started
+    # their threads can deadlock
+    with ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        return list(executor.map(_generate_map_worker, requests))
+
+
 if __name__ == "__main__":
     list_circuits = ListCircuitsParams(
         nbr_circuits=3,
@@ -5,6 +5,13 @@ import structlog
 
 logger = structlog.get_logger()
 
+# Valid department codes: 01-95, 971-989, 2A and 2B
+VALID_DEPARTEMENTS = frozenset(
+    [f"{num:02d}" for num in range(1, 96)]
+    + [str(num) for num in range(971, 990)]
+    + ["2A", "2B"]
+)
+
 
 def check_folder_path(folder_path: pathlib.Path | None) -> pathlib.Path:
     if folder_path is None:
@@ -16,25 +23,14 @@ def check_folder_path(folder_path: pathlib.Path | None) -> pathlib.Path:
 
 
 def validate_departement(departement: str | int) -> str:
-    # Convert to string if it's an integer
-    if isinstance(departement, int):
-        departement = str(departement)
-
-    # Handle string cases (including 'a' or 'b')
-    if isinstance(departement, str):
-        departement = departement.upper()  # Transform 'a' or 'b' to 'A' or 'B'
-
-        # Check for valid string formats (2A or 2B)
-        if departement in ["2A", "2B"]:
-            return departement
-
-        # Check for valid integer ranges (01-95 or 971-989)
-        if departement.isdigit():
-            num = int(departement)
-            if (1 <= num <= 95) or (971 <= num <= 989):
-                return departement.zfill(
-                    2
-                )  # Pad with leading zero if needed (e.g., 1 → "01")
+    # Transform 'a' or 'b' to 'A' or 'B'
+    departement = str(departement).upper()
+    if departement.isdigit():
+        # Pad with leading zero if needed (e.g., 1 → "01")
+        departement = departement.zfill(2)
+
+    if departement in VALID_DEPARTEMENTS:
+        return departement
 
     # Return None or raise an error if invalid
     logger.error("Invalid departement", departement=departement)